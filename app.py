@@ -1,74 +1,17 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime, timedelta, date
 import calendar
 import numpy as np
+from data import load_data, get_spreadsheet, invalidate_data_cache, EXPENSE_CATEGORIES, TIME_CATEGORIES
 
 # --- CONFIGURATION ---
 st.set_page_config(page_title="Life Operating System", page_icon="🧬", layout="wide")
 
-# --- AUTHENTICATION ---
-def get_gspread_client():
-    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-    creds_dict = dict(st.secrets["gcp_service_account"])
-    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-    return gspread.authorize(creds)
-
-# --- LOAD DATA (FORCE MINUTES) ---
-@st.cache_data(ttl=60)
-def load_data():
-    client = get_gspread_client()
-    sh = client.open("Master_Finance_DB")
-    
-    # 1. FINANCE TRANSACTIONS
-    try:
-        ws_tx = sh.sheet1
-        raw_tx = ws_tx.get_all_values()
-        df_tx = pd.DataFrame(raw_tx[1:], columns=raw_tx[0]) if len(raw_tx) > 1 else pd.DataFrame()
-        if not df_tx.empty:
-            df_tx['Amount'] = pd.to_numeric(df_tx['Amount'].astype(str).str.replace(r'[^\d.-]', '', regex=True), errors='coerce').fillna(0)
-            df_tx['Date'] = pd.to_datetime(df_tx['Date'].astype(str).apply(lambda x: x.split(' ')[0]), errors='coerce')
-            df_tx['Month_Sort'] = df_tx['Date'].dt.strftime('%Y-%m')
-    except: df_tx = pd.DataFrame()
-
-    # 2. BUDGET TARGETS
-    try:
-        ws_budget = sh.worksheet("Budgets")
-        raw_b = ws_budget.get_all_values()
-        df_budget = pd.DataFrame(raw_b[1:], columns=raw_b[0]) if len(raw_b) > 1 else pd.DataFrame()
-        if not df_budget.empty:
-            df_budget['Monthly_Limit'] = pd.to_numeric(df_budget['Monthly_Limit'].astype(str).str.replace(r'[^\d.-]', '', regex=True), errors='coerce').fillna(0)
-    except: df_budget = pd.DataFrame(columns=['Category', 'Monthly_Limit'])
-
-    # 3. TIME LOGS (FIX: ALWAYS TREAT AS MINUTES)
-    try:
-        ws_time = sh.worksheet("Time_Logs")
-        raw_time = ws_time.get_all_values()
-        df_time = pd.DataFrame(raw_time[1:], columns=raw_time[0]) if len(raw_time) > 1 else pd.DataFrame()
-        if not df_time.empty:
-            # We grab the 4th column (Index 3) regardless of whether it's named 'Hours' or 'Duration_Mins'
-            # This ensures we always get the number you typed.
-            time_col = df_time.columns[3] if len(df_time.columns) > 3 else 'Duration_Mins'
-            
-            df_time['Minutes_Logged'] = pd.to_numeric(df_time[time_col], errors='coerce').fillna(0)
-            
-            # FORCE CONVERSION: Always divide by 60 to get Hours for charts
-            df_time['Hours'] = df_time['Minutes_Logged'] / 60
-            
-            df_time['Date'] = pd.to_datetime(df_time['Date'].astype(str), errors='coerce')
-            df_time['Month_Sort'] = df_time['Date'].dt.strftime('%Y-%m')
-            df_time['Category'] = df_time['Category'].astype(str).str.strip()
-    except: df_time = pd.DataFrame()
-
-    return df_tx, df_budget, df_time
-
 # --- MAIN LOGIC ---
 try:
-    df_tx, df_budget, df_time = load_data()
+    df_tx, df_budget, df_time, daily_by_month, cat_by_month = load_data()
 except Exception as e:
     st.error(f"Data Error: {e}")
     st.stop()
@@ -77,16 +20,16 @@ except Exception as e:
 with st.sidebar:
     st.header("⚙️ Controls")
     if st.button("🔄 Refresh Data"):
-        st.cache_data.clear()
+        invalidate_data_cache()
         st.rerun()
     st.divider()
 
     # Month Selector
-    all_months = set()
-    if not df_tx.empty: all_months.update(df_tx['Month_Sort'].dropna())
-    if not df_time.empty: all_months.update(df_time['Month_Sort'].dropna())
-    all_months = sorted(list(all_months), reverse=True)
-    selected_month = st.selectbox("Select Month", all_months) if all_months else "No Data"
+    empty_months = pd.PeriodIndex([], freq='M')
+    months_tx = pd.PeriodIndex(df_tx['Month_Sort'].dropna().unique()) if not df_tx.empty else empty_months
+    months_time = pd.PeriodIndex(df_time['Month_Sort'].dropna().unique()) if not df_time.empty else empty_months
+    all_months = months_tx.union(months_time).sort_values(ascending=False)
+    selected_month = st.selectbox("Select Month", all_months, format_func=lambda p: p.strftime('%b %Y')) if len(all_months) else None
 
     st.divider()
 
@@ -94,19 +37,22 @@ with st.sidebar:
     with st.expander("💸 Add Expense", expanded=False):
         with st.form(key='add_txn_form'):
             input_amount = st.number_input("Amount", min_value=0.0, step=10.0)
-            input_category = st.selectbox("Category", ["Food", "Transport", "Bills", "Shopping", "Entertainment", "Health", "Investments","Travel"])
+            input_category = st.selectbox("Category", EXPENSE_CATEGORIES)
             input_desc = st.text_input("Description (Expense)")
             input_mode = st.selectbox("Payment Mode", ["UPI", "Credit Card", "Cash","SI"])
             
             if st.form_submit_button('Save Expense'):
                 try:
-                    client = get_gspread_client()
-                    sheet = client.open("Master_Finance_DB").sheet1
+                    sh = get_spreadsheet()
                     ist_now = datetime.utcnow() + timedelta(hours=5, minutes=30)
                     date_str = ist_now.strftime("%Y-%m-%d %H:%M:%S")
-                    sheet.append_row([date_str, input_amount, input_category, input_desc, input_mode])
+                    # values_append on the A1 range goes straight to the API —
+                    # no .sheet1 metadata fetch per submit.
+                    sh.values_append("Sheet1!A:E",
+                                     params={'valueInputOption': 'USER_ENTERED'},
+                                     body={'values': [[date_str, input_amount, input_category, input_desc, input_mode]]})
                     st.success("Expense Saved!")
-                    st.cache_data.clear()
+                    invalidate_data_cache()
                     st.rerun()
                 except Exception as e:
                     st.error(f"Error: {e}")
@@ -115,7 +61,7 @@ with st.sidebar:
     with st.expander("⏱️ Log Time", expanded=True):
         with st.form(key='add_time_form'):
             t_date = st.date_input("Date", value=date.today())
-            t_cat = st.selectbox("Category", ["Deep Work", "Meetings", "Commute", "Health/Gym", "Learning", "Life Admin", "Sleep", "Entertainment"])
+            t_cat = st.selectbox("Category", TIME_CATEGORIES)
             t_desc = st.text_input("Activity Description")
             
             # EXPLICIT MINUTE INPUT
@@ -123,70 +69,146 @@ with st.sidebar:
             
             if st.form_submit_button('Save Time Log'):
                 try:
-                    client = get_gspread_client()
-                    sh = client.open("Master_Finance_DB")
-                    
+                    sh = get_spreadsheet()
+
                     try:
-                        ws_t = sh.worksheet("Time_Logs")
-                    except:
+                        sh.worksheet("Time_Logs")
+                    except gspread.WorksheetNotFound:
                         ws_t = sh.add_worksheet(title="Time_Logs", rows=1000, cols=5)
                         ws_t.append_row(["Date", "Category", "Activity", "Duration_Mins"])
-                    
+
                     # We save the raw minutes (e.g., 90)
-                    ws_t.append_row([str(t_date), t_cat, t_desc, t_mins])
+                    sh.values_append("Time_Logs!A:D",
+                                     params={'valueInputOption': 'USER_ENTERED'},
+                                     body={'values': [[str(t_date), t_cat, t_desc, t_mins]]})
                     st.success(f"Logged {t_mins} mins!")
-                    st.cache_data.clear()
+                    invalidate_data_cache()
                     st.rerun()
                 except Exception as e:
                     st.error(f"Error: {e}")
 
+# --- FIGURE BUILDERS ---
+# Memoized so reruns triggered by unrelated widgets (e.g. the income input)
+# reuse the built go.Figure instead of reconstructing it. plotly is imported
+# inside the builders: its ~200ms cold import is only paid once there is
+# actually something to draw (repeat imports are a module-cache lookup).
+@st.cache_data
+def build_burndown_fig(daily_spends, total_budget):
+    import plotly.graph_objects as go
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=daily_spends['Date'], y=daily_spends['Remaining'], mode='lines+markers', name='Actual', line=dict(color='#00CC96', width=3)))
+    fig.add_trace(go.Scatter(x=daily_spends['Date'], y=daily_spends['Ideal'], mode='lines', name='Ideal Pace', line=dict(color='gray', dash='dash')))
+    fig.update_layout(title="📉 Budget Burndown", xaxis_title="Date", yaxis_title="Remaining")
+    return fig
+
+@st.cache_data
+def build_pie_fig(values, labels, title=None):
+    import plotly.graph_objects as go
+    fig = go.Figure(go.Pie(values=values, labels=labels, hole=0.4))
+    if title:
+        fig.update_layout(title=title)
+    return fig
+
+@st.cache_data
+def build_rhythm_fig(daily_stack):
+    import plotly.graph_objects as go
+    fig = go.Figure()
+    for cat, grp in daily_stack.groupby('Category', sort=False, observed=True):
+        fig.add_trace(go.Bar(x=grp['Date'].to_numpy(), y=grp['Hours'].to_numpy(), name=str(cat)))
+    fig.update_layout(barmode='stack', title="Daily Rhythm (Hours)", xaxis_title="Date", yaxis_title="Hours")
+    return fig
+
+def compute_daily_stack(sub_time, month):
+    # Dense (day x category) scatter-add: one np.add.at pass over the
+    # category codes instead of hashing (timestamp, category) pairs in a
+    # two-key groupby. Only non-zero cells go back to the long frame.
+    codes = sub_time['Category'].cat.codes.to_numpy()
+    day_idx = sub_time['Date'].dt.day.to_numpy() - 1
+    hours = sub_time['Hours'].to_numpy()
+    valid = codes >= 0
+    last_day = calendar.monthrange(month.year, month.month)[1]
+    cats = sub_time['Category'].cat.categories
+    mat = np.zeros((last_day, len(cats)))
+    np.add.at(mat, (day_idx[valid], codes[valid]), hours[valid])
+    nz_day, nz_cat = np.nonzero(mat)
+    return pd.DataFrame({
+        'Date': pd.date_range(start=month.to_timestamp(), periods=last_day)[nz_day],
+        'Category': cats[nz_cat],
+        'Hours': mat[nz_day, nz_cat],
+    })
+
+def month_category_totals(cat_by_month, month):
+    # groupby drops NaN keys, so a month whose rows all lack a Category
+    # (ragged hand-entered rows padded with NaN) shows up in the split
+    # frames but not in the aggregate — hand back an empty Series instead
+    # of letting .loc raise KeyError.
+    if len(cat_by_month) and month in cat_by_month.index.get_level_values(0):
+        return cat_by_month.loc[month]
+    # Same shape as the real aggregate so reset_index() still yields
+    # Category/Amount columns downstream.
+    return pd.Series(dtype=float, name='Amount').rename_axis('Category')
+
 # --- TABS ---
 tab_fin, tab_budget, tab_time, tab_raw = st.tabs(["📊 Analytics", "🎯 Budget vs Actual", "⏳ Time Audit", "📄 Data"])
 
 # 1. FILTER DATA
-sub_tx = df_tx[df_tx['Month_Sort'] == selected_month] if not df_tx.empty else pd.DataFrame()
-sub_time = df_time[df_time['Month_Sort'] == selected_month] if not df_time.empty else pd.DataFrame()
+# One cached groupby split per data refresh; selecting a month is then a
+# dict lookup instead of a full-column mask on every rerun.
+@st.cache_data
+def split_by_month(df):
+    if df.empty or 'Month_Sort' not in df.columns:
+        return {}
+    return {m: g for m, g in df.groupby('Month_Sort', sort=False, observed=True)}
+
+_EMPTY = pd.DataFrame()
+sub_tx = split_by_month(df_tx).get(selected_month, _EMPTY)
+sub_time = split_by_month(df_time).get(selected_month, _EMPTY)
 
 # --- TAB 1: ANALYTICS ---
 with tab_fin:
     if not sub_tx.empty:
         total_spend = sub_tx['Amount'].sum()
         total_budget = df_budget['Monthly_Limit'].sum() if not df_budget.empty else 0
-        
-        k1, k2, k3 = st.columns(3)
+        month_cats = month_category_totals(cat_by_month, selected_month)
+
+        k1, k2, k3, k4 = st.columns(4)
         k1.metric("Total Spent", f"₹{total_spend:,.0f}")
         k2.metric("Budget Limit", f"₹{total_budget:,.0f}")
         k3.metric("Remaining", f"₹{total_budget - total_spend:,.0f}", delta_color="normal")
+        k4.metric("Top Category", str(month_cats.idxmax()) if len(month_cats) else "—")
         
         c1, c2 = st.columns([2, 1])
         with c1:
             if total_budget > 0:
-                year, month = map(int, selected_month.split('-'))
-                last_day = calendar.monthrange(year, month)[1]
+                last_day = calendar.monthrange(selected_month.year, selected_month.month)[1]
                 all_dates = pd.date_range(start=f"{selected_month}-01", end=f"{selected_month}-{last_day}")
                 
-                daily_spends = sub_tx.groupby('Date')['Amount'].sum().reindex(all_dates, fill_value=0).reset_index()
-                daily_spends.columns = ['Date', 'Daily_Spend']
-                daily_spends['Cumulative_Spend'] = daily_spends['Daily_Spend'].cumsum()
-                daily_spends['Remaining'] = total_budget - daily_spends['Cumulative_Spend']
-                daily_spends['Ideal'] = [total_budget - (total_budget/last_day * (i+1)) for i in range(len(daily_spends))]
+                # Scatter the month's daily sums onto the calendar grid with a
+                # bincount on day-of-month — no hashing, no reindex alignment.
+                month_daily = daily_by_month.loc[selected_month]
+                daily = np.bincount(month_daily.index.day - 1, weights=month_daily.to_numpy(), minlength=last_day)
+                daily_spends = pd.DataFrame({
+                    'Date': all_dates,
+                    'Daily_Spend': daily,
+                    'Remaining': total_budget - daily.cumsum(),
+                    'Ideal': total_budget - (total_budget / last_day) * np.arange(1, last_day + 1),
+                })
                 
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(x=daily_spends['Date'], y=daily_spends['Remaining'], mode='lines+markers', name='Actual', line=dict(color='#00CC96', width=3)))
-                fig.add_trace(go.Scatter(x=daily_spends['Date'], y=daily_spends['Ideal'], mode='lines', name='Ideal Pace', line=dict(color='gray', dash='dash')))
-                fig.update_layout(title="📉 Budget Burndown", xaxis_title="Date", yaxis_title="Remaining")
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(build_burndown_fig(daily_spends, total_budget), use_container_width=True)
             else:
                 st.info("Set budgets in 'Budgets' tab.")
         with c2:
-            cat_agg = sub_tx.groupby('Category')['Amount'].sum().reset_index()
-            st.plotly_chart(px.pie(cat_agg, values='Amount', names='Category', hole=0.4), use_container_width=True)
+            cat_agg = month_cats.reset_index()
+            st.plotly_chart(build_pie_fig(cat_agg['Amount'].to_numpy(), cat_agg['Category'].astype(str).to_numpy()), use_container_width=True)
 
 # --- TAB 2: BUDGET VS ACTUAL ---
 with tab_budget:
     if not sub_tx.empty and not df_budget.empty:
-        actuals = sub_tx.groupby('Category')['Amount'].sum().reset_index()
-        merged = pd.merge(df_budget, actuals, on='Category', how='outer').fillna(0)
+        # Series.align does the outer join + zero fill on the index directly —
+        # no merge machinery, no reset_index round trip on the aggregate.
+        limits = df_budget.set_index('Category')['Monthly_Limit']
+        limits, actuals = limits.align(month_category_totals(cat_by_month, selected_month), fill_value=0)
+        merged = pd.DataFrame({'Monthly_Limit': limits, 'Amount': actuals}).reset_index()
         
         merged['Usage %'] = 0.0
         mask_valid = merged['Monthly_Limit'] > 0
@@ -195,24 +217,18 @@ with tab_budget:
         merged.loc[mask_zero, 'Usage %'] = 100.0
         merged = merged.replace([np.inf, -np.inf], 0)
         merged = merged.sort_values(by='Amount', ascending=False)
-        
-        for i, row in merged.iterrows():
-            cat = row['Category']
-            spent = float(row['Amount'])
-            limit = float(row['Monthly_Limit'])
-            pct = row['Usage %']
-            col_status = "✅" if pct < 80 else "⚠️" if pct < 100 else "🚨"
-            c1, c2 = st.columns([3, 1])
-            with c1:
-                st.write(f"**{cat}** {col_status}")
-                try:
-                    if pd.isna(pct): pct = 0
-                    safe_pct = int(pct)
-                    safe_pct = max(0, min(safe_pct, 100))
-                    st.progress(safe_pct)
-                except: st.progress(0)
-            with c2:
-                st.write(f"₹{spent:,.0f} / ₹{limit:,.0f}")
+
+        # One vectorized pass + a single dataframe widget instead of a
+        # Python loop spawning st.columns/st.progress per category.
+        merged['Status'] = np.select([merged['Usage %'] < 80, merged['Usage %'] < 100], ['✅', '⚠️'], default='🚨')
+        merged['Spend'] = '₹' + merged['Amount'].map('{:,.0f}'.format) + ' / ₹' + merged['Monthly_Limit'].map('{:,.0f}'.format)
+        merged['Usage %'] = merged['Usage %'].fillna(0).clip(0, 100)
+        st.dataframe(
+            merged[['Category', 'Status', 'Usage %', 'Spend']],
+            column_config={'Usage %': st.column_config.ProgressColumn('Usage %', min_value=0, max_value=100, format='%d%%')},
+            hide_index=True,
+            use_container_width=True,
+        )
     else:
         st.info("Add transactions and budgets.")
 
@@ -220,12 +236,24 @@ with tab_budget:
 with tab_time:
     if not sub_time.empty:
         # NOTE: Calculations are based on 'Hours' column (derived from Minutes / 60)
-        total_hrs = sub_time['Hours'].sum()
-        
-        work_hrs = sub_time[sub_time['Category'].isin(['Deep Work', 'Meetings'])]['Hours'].sum()
-        commute_hrs = sub_time[sub_time['Category'] == 'Commute']['Hours'].sum()
-        health_hrs = sub_time[sub_time['Category'] == 'Health/Gym']['Hours'].sum()
-        learn_hrs = sub_time[sub_time['Category'] == 'Learning']['Hours'].sum()
+        # One groupby pass feeds every metric (and the pie below) instead of
+        # four separate boolean-mask scans over Category. The results are
+        # pinned in session_state keyed by month + a cheap fingerprint, so
+        # unrelated reruns skip even the groupby; fresh appends change the
+        # fingerprint and recompute.
+        bundle_key = ('time_bundle', selected_month, len(sub_time), float(sub_time['Minutes_Logged'].sum()))
+        if bundle_key not in st.session_state:
+            st.session_state[bundle_key] = (
+                sub_time.groupby('Category', sort=False, observed=True)['Hours'].sum(),
+                compute_daily_stack(sub_time, selected_month),
+            )
+        cat_hours, daily_stack = st.session_state[bundle_key]
+
+        total_hrs = cat_hours.sum()
+        work_hrs = cat_hours.get('Deep Work', 0) + cat_hours.get('Meetings', 0)
+        commute_hrs = cat_hours.get('Commute', 0)
+        health_hrs = cat_hours.get('Health/Gym', 0)
+        learn_hrs = cat_hours.get('Learning', 0)
 
         m1, m2, m3, m4 = st.columns(4)
         m1.metric("Total Logged", f"{total_hrs:.1f}h")
@@ -236,16 +264,19 @@ with tab_time:
         st.divider()
         c_vis, c_stack = st.columns(2)
         with c_vis:
-            st.plotly_chart(px.pie(sub_time, values='Hours', names='Category', hole=0.4, title="Time Distribution (Hours)"), use_container_width=True)
+            st.plotly_chart(build_pie_fig(cat_hours.to_numpy(), cat_hours.index.astype(str).to_numpy(), title="Time Distribution (Hours)"), use_container_width=True)
         with c_stack:
-            daily_stack = sub_time.groupby(['Date', 'Category'])['Hours'].sum().reset_index()
-            st.plotly_chart(px.bar(daily_stack, x='Date', y='Hours', color='Category', title="Daily Rhythm (Hours)"), use_container_width=True)
+            st.plotly_chart(build_rhythm_fig(daily_stack), use_container_width=True)
             
         st.divider()
         st.subheader("🧠 Real Hourly Rate")
         c_calc, _ = st.columns([1, 2])
         with c_calc:
-            salary = st.number_input("Monthly Income", value=100000, step=5000)
+            # Inside a form, edits to the income field don't rerun the whole
+            # script per keystroke — the value lands on Calculate.
+            with st.form(key='rate_form'):
+                salary = st.number_input("Monthly Income", value=100000, step=5000)
+                st.form_submit_button('Calculate')
             real_effort = work_hrs + commute_hrs
             if real_effort > 0:
                 days_logged = sub_time['Date'].nunique()
@@ -258,8 +289,11 @@ with tab_time:
 
 # --- TAB 4: RAW DATA ---
 with tab_raw:
-    st.subheader("Transactions")
-    st.dataframe(sub_tx, use_container_width=True)
-    st.divider()
-    st.subheader("Time Logs (Raw Data)")
-    st.dataframe(sub_time, use_container_width=True)
\ No newline at end of file
+    # Only Arrow-serialize the frames when someone is actually looking at them;
+    # otherwise every sidebar interaction pays for two dataframe payloads.
+    if st.toggle("Show raw tables", key="show_raw"):
+        st.subheader("Transactions")
+        st.dataframe(sub_tx, use_container_width=True)
+        st.divider()
+        st.subheader("Time Logs (Raw Data)")
+        st.dataframe(sub_time, use_container_width=True)
\ No newline at end of file
@@ -0,0 +1,213 @@
+# --- DATA LAYER: SHEETS AUTH, FETCH, CLEANING, CACHING ---
+import streamlit as st
+import pandas as pd
+import gspread
+import os
+import time
+
+# Deletes currency symbols / separators via a precomputed translate table —
+# a C memchr pass per string, no regex engine at all.
+_NUMERIC_JUNK = str.maketrans('', '', '₹$€£,  ')
+
+# Canonical option lists — shared by the entry forms and the categorical
+# casts so category codes stay stable across loads.
+EXPENSE_CATEGORIES = ["Food", "Transport", "Bills", "Shopping", "Entertainment", "Health", "Investments", "Travel"]
+TIME_CATEGORIES = ["Deep Work", "Meetings", "Commute", "Health/Gym", "Learning", "Life Admin", "Sleep", "Entertainment"]
+
+def _as_fixed_category(s, known):
+    # Known options first (stable integer codes), hand-entered stragglers
+    # appended after — nothing silently coerces to NaN.
+    extras = [v for v in s.dropna().unique() if v not in known]
+    return pd.Categorical(s, categories=list(known) + extras)
+
+# --- AUTHENTICATION ---
+@st.cache_resource(ttl=3600, show_spinner=False)
+def get_gspread_client():
+    return gspread.service_account_from_dict(dict(st.secrets["gcp_service_account"]))
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def get_spreadsheet():
+    # open() resolves the title via a metadata round trip — do it once per
+    # process, not once per submit.
+    return get_gspread_client().open("Master_Finance_DB")
+
+# --- LOAD DATA (FORCE MINUTES) ---
+def fetch_raw_frames_csv():
+    # Read-only fast path: the published CSV export skips OAuth + gspread's JSON
+    # cell marshalling and lands straight in pandas' C parser.
+    # Needs [sheet_csv] in secrets: sheet_id plus tx_gid / budget_gid / time_gid.
+    cfg = st.secrets["sheet_csv"]
+    base = f"https://docs.google.com/spreadsheets/d/{cfg['sheet_id']}/export?format=csv&gid="
+    frames = []
+    for gid_key in ("tx_gid", "budget_gid", "time_gid"):
+        try:
+            frames.append(pd.read_csv(base + str(cfg[gid_key]), dtype=str))
+        except (KeyError, OSError, ValueError):
+            frames.append(pd.DataFrame())
+    return frames
+
+def fetch_raw_frames_api():
+    sh = get_spreadsheet()
+
+    # ONE batchGet round trip for all three tabs (instead of one HTTPS call per tab).
+    # A missing tab just comes back without a 'values' key and falls through to empty.
+    try:
+        resp = sh.values_batch_get(
+            ranges=["Sheet1!A:E", "Budgets!A:B", "Time_Logs!A:D"],
+            params={"valueRenderOption": "UNFORMATTED_VALUE", "dateTimeRenderOption": "FORMATTED_STRING"},
+        )
+        value_ranges = resp.get("valueRanges", [])
+    except (gspread.exceptions.GSpreadException, OSError):
+        # APIError is a GSpreadException; requests' transport errors are
+        # OSErrors. Anything else should surface, not silently blank the app.
+        value_ranges = []
+    raws = [vr.get("values", []) for vr in value_ranges]
+    raws += [[]] * (3 - len(raws))
+    return [pd.DataFrame(raw[1:], columns=raw[0]) if len(raw) > 1 else pd.DataFrame() for raw in raws]
+
+# Disk cache: st.cache_data dies with the process (Streamlit Cloud recycles
+# freely); a Parquet copy of the cleaned frames makes a cold start a ~10ms
+# local read instead of a Sheets round trip + re-clean.
+CACHE_DIR = "/tmp/finance_hq_cache"
+CACHE_TTL = 60
+_CACHE_FILES = ("tx.parquet", "budget.parquet", "time.parquet")
+
+def read_disk_cache(max_age=CACHE_TTL):
+    try:
+        paths = [os.path.join(CACHE_DIR, f) for f in _CACHE_FILES]
+        if all(os.path.exists(p) for p in paths) and (max_age is None or time.time() - os.path.getmtime(paths[0]) < max_age):
+            return tuple(pd.read_parquet(p) for p in paths)
+    except (OSError, ValueError): pass
+    return None
+
+def write_disk_cache(df_tx, df_budget, df_time):
+    # All-or-nothing: land all three under temp names first, then rename.
+    # If any write fails, the previous complete trio stays in place instead
+    # of a fresh tx/budget pair getting served next to a stale time frame.
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        renames = []
+        for df, f in zip((df_tx, df_budget, df_time), _CACHE_FILES):
+            tmp = os.path.join(CACHE_DIR, f + '.tmp')
+            df.to_parquet(tmp)
+            renames.append((tmp, os.path.join(CACHE_DIR, f)))
+        for tmp, dst in renames:
+            os.replace(tmp, dst)
+    except (OSError, ValueError):
+        for f in _CACHE_FILES:
+            try: os.remove(os.path.join(CACHE_DIR, f + '.tmp'))
+            except OSError: pass
+
+def fetch_clean_frames():
+    if "sheet_csv" in st.secrets:
+        df_tx, df_budget, df_time = fetch_raw_frames_csv()
+    else:
+        df_tx, df_budget, df_time = fetch_raw_frames_api()
+
+    # 1. FINANCE TRANSACTIONS
+    try:
+        if not df_tx.empty:
+            # float32 is plenty for INR amounts and halves the bytes every
+            # downstream sum/groupby/serialization touches.
+            df_tx['Amount'] = pd.to_numeric(df_tx['Amount'].astype(str).str.translate(_NUMERIC_JUNK), errors='coerce').fillna(0).astype('float32')
+            df_tx['Date'] = pd.to_datetime(df_tx['Date'].astype(str).str.split(' ', n=1).str[0], format='%Y-%m-%d', errors='coerce', cache=True)
+            df_tx['Month_Sort'] = df_tx['Date'].dt.to_period('M')
+    except (KeyError, ValueError, TypeError): df_tx = pd.DataFrame()
+
+    # 2. BUDGET TARGETS
+    try:
+        if not df_budget.empty:
+            df_budget['Monthly_Limit'] = pd.to_numeric(df_budget['Monthly_Limit'].astype(str).str.translate(_NUMERIC_JUNK), errors='coerce').fillna(0).astype('float32')
+    except (KeyError, ValueError, TypeError): df_budget = pd.DataFrame(columns=['Category', 'Monthly_Limit'])
+
+    # 3. TIME LOGS (FIX: ALWAYS TREAT AS MINUTES)
+    try:
+        if not df_time.empty:
+            # We grab the 4th column (Index 3) regardless of whether it's named 'Hours' or 'Duration_Mins'
+            # This ensures we always get the number you typed.
+            time_col = df_time.columns[3] if len(df_time.columns) > 3 else 'Duration_Mins'
+
+            # Accept "H:MM"/"H:MM:SS" entries alongside plain minute counts,
+            # all in vectorized string ops (no per-row parse function).
+            dur = df_time[time_col].astype(str).str.strip()
+            has_colon = dur.str.contains(':', regex=False)
+            plain_mins = pd.to_numeric(dur.where(~has_colon), errors='coerce')
+            clock_mins = pd.to_timedelta(
+                dur.where(has_colon).str.replace(r'^(\d+):(\d+)$', r'\1:\2:00', regex=True),
+                errors='coerce').dt.total_seconds() / 60
+            df_time['Minutes_Logged'] = plain_mins.fillna(clock_mins).fillna(0).astype('float32')
+            # Keep the raw column as uniform strings: UNFORMATTED_VALUE hands
+            # back numbers for plain entries and strings for clock-style ones,
+            # and that mixed object column won't survive to_parquet.
+            df_time[time_col] = dur
+            
+            # FORCE CONVERSION: Always divide by 60 to get Hours for charts
+            df_time['Hours'] = df_time['Minutes_Logged'] / 60
+            
+            df_time['Date'] = pd.to_datetime(df_time['Date'].astype(str).str.split('T', n=1).str[0], format='%Y-%m-%d', errors='coerce', cache=True)
+            df_time['Month_Sort'] = df_time['Date'].dt.to_period('M')
+            df_time['Category'] = df_time['Category'].astype(str).str.strip()
+    except (KeyError, ValueError, TypeError): df_time = pd.DataFrame()
+
+    return df_tx, df_budget, df_time
+
+@st.cache_data(ttl=60)
+def load_data():
+    frames = read_disk_cache()
+    if frames is None:
+        frames = fetch_clean_frames()
+        if any(not f.empty for f in frames):
+            write_disk_cache(*frames)
+        else:
+            # Fetch came back with nothing (Sheets hiccup / quota) — stale
+            # data beats a blank dashboard, so fall back to the last Parquet
+            # copies regardless of their age.
+            stale = read_disk_cache(max_age=None)
+            if stale is not None:
+                frames = stale
+    df_tx, df_budget, df_time = frames
+
+    # Low-cardinality string columns as category: ~10x less memory and
+    # integer-code groupby/equality instead of per-row string hashing.
+    # (Month_Sort is a Period column — already int64-backed.)
+    if 'Category' in df_tx.columns:
+        df_tx['Category'] = _as_fixed_category(df_tx['Category'], EXPENSE_CATEGORIES)
+    for c in ('Mode', 'Payment Mode'):
+        if c in df_tx.columns:
+            df_tx[c] = df_tx[c].astype('category')
+    if 'Category' in df_time.columns:
+        df_time['Category'] = _as_fixed_category(df_time['Category'], TIME_CATEGORIES)
+
+    # Free-text columns move off object dtype onto Arrow-backed strings:
+    # contiguous buffers instead of scattered PyObjects, cheaper slicing and
+    # faster st.dataframe serialization.
+    for df in (df_tx, df_time):
+        for c in ('Description', 'Activity'):
+            if c in df.columns:
+                df[c] = df[c].astype('string[pyarrow]')
+
+    # Sort newest-first once here so the raw-data tables are already in
+    # display order and no per-rerun sort is needed.
+    if 'Date' in df_tx.columns:
+        df_tx = df_tx.sort_values('Date', ascending=False, kind='mergesort', ignore_index=True)
+    if 'Date' in df_time.columns:
+        df_time = df_time.sort_values('Date', ascending=False, kind='mergesort', ignore_index=True)
+
+    # Pre-aggregate once for every month; tabs then do an O(1) .loc lookup
+    # instead of re-masking + re-grouping the full frame on each rerun.
+    if not df_tx.empty and 'Month_Sort' in df_tx.columns:
+        daily_by_month = df_tx.groupby(['Month_Sort', 'Date'], sort=False, observed=True)['Amount'].sum()
+        cat_by_month = df_tx.groupby(['Month_Sort', 'Category'], sort=False, observed=True)['Amount'].sum()
+    else:
+        daily_by_month = pd.Series(dtype=float)
+        cat_by_month = pd.Series(dtype=float)
+
+    return df_tx, df_budget, df_time, daily_by_month, cat_by_month
+
+def invalidate_data_cache():
+    # Drop just the data layers (memo entry + Parquet copies) so the next
+    # load refetches from Sheets; other cached resources stay warm.
+    load_data.clear()
+    for f in _CACHE_FILES:
+        try: os.remove(os.path.join(CACHE_DIR, f))
+        except OSError: pass